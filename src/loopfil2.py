@@ -1,20 +1,23 @@
+import mmap
 import os
 
-directory = os.getcwd()
-for filename in os.listdir(directory):
-    if filename.endswith(".rs") or filename.endswith(".png"):
-        print(os.path.join(directory, filename))
+_SUFFIXES = (".rs", ".png")
 
-        #remove last line from a text line in python
-        fd=open(filename,"r")
-        d=fd.read()
-        fd.close()
-        m=d.split("\n")
-        s="\n".join(m[:-1])
-        fd=open(filename,"w+")
-        for i in range(len(s)):
-            fd.write(s[i])
-        fd.close()
-                
-    else:
-        continue
\ No newline at end of file
+with os.scandir('.') as it:
+    entries = [entry for entry in it
+               if entry.name.endswith(_SUFFIXES) and entry.is_file()]
+
+for entry in entries:
+    filename = entry.name
+    print(filename)
+
+    #remove last line from a text line in python
+    with open(filename,"r+b") as fd:
+        cut=0
+        if os.fstat(fd.fileno()).st_size>0:
+            with mmap.mmap(fd.fileno(),0,access=mmap.ACCESS_READ) as mm:
+                cut=max(mm.rfind(b"\n"),0)
+                #drop the \r of a final CRLF, earlier line endings are kept
+                if mm[cut-1:cut]==b"\r":
+                    cut-=1
+        fd.truncate(cut)
@@ -1,45 +1,57 @@
 import os
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+_SUFFIXES = (".rs", ".png")
+# Bounded so concurrent reads stay well below the open file limit.
+_MAX_WORKERS = 64
+_REMOVE_LOG = "Remove last line with 999"
+_APPEND_LOG = "Append last line with 999"
 
 # this script loop through all files in thec
 
+def _last_line(entry):
+    # entry.stat() is one stat call cached on the entry; empty files are
+    # never opened.
+    size = entry.stat().st_size
+    if size == 0:
+        return ""
+    with open(entry.name, "rb") as file_object:
+        # Only the tail of the file is needed to find its last line.
+        file_object.seek(max(0, size - 256))
+        tail = file_object.read()
+    return tail.rsplit(b"\n", 1)[-1].decode(errors="replace")
+
 def loopfile():
-    directory = os.getcwd()
-    for filename in os.listdir(directory):
-        if filename.endswith(".rs") or filename.endswith(".png"):
-            print(os.path.join(directory, filename))
-
-            with open(filename, "a+") as file_object:
-                    # Move read cursor to the start of file.
-                    file_object.seek(0)
-                    # If file is not empty then append '\n'
-                    data = file_object.read(100)
-                    
-                    for last_line in file_object:
-                        pass 
-                    print(filename)
-                    print(last_line)
-
-                    # If the file is updated in the last cycle
-                    if last_line == "999":
-                        remove_999()
-                    else:
-                        append_999()
-                    #if len(data) > 0 :
-                     #   file_object.write("\n")
-                    # Append text at the end of file
-                    #file_object.write("9371")
-                    
+    with os.scandir('.') as it:
+        entries = [entry for entry in it
+                   if entry.name.endswith(_SUFFIXES) and entry.is_file()]
+
+    # First pass only reads, so the updates below are done in one batch.
+    with ThreadPoolExecutor(max_workers=_MAX_WORKERS) as executor:
+        last_lines = list(executor.map(_last_line, entries))
+
+    logs = []
+    for entry, last_line in zip(entries, last_lines):
+        logs.append("%s\n%s\n" % (entry.name, last_line))
+        # If the file is updated in the last cycle
+        if last_line == "999":
+            logs.append(_REMOVE_LOG + "\n")
         else:
-            continue
+            logs.append(_APPEND_LOG + "\n")
+    # One write for the whole listing; stdout may be line buffered.
+    sys.stdout.write("".join(logs))
 
 def remove_999():
-    print("Remove last line with 999")
+    print(_REMOVE_LOG)
 
 def append_999():
-    print("Append last line with 999")
+    print(_APPEND_LOG)
 
 def commit():
-    os.system('git commit -a -m "merge and update" > /dev/null 2>&1')
+    subprocess.run(['git', 'commit', '-a', '-m', 'merge and update'],
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
 
 def set_sys_time(year, month, day):
     os.system('date -s %04d%02d%02d' % (year, month, day))
@@ -1,87 +1,244 @@
+import calendar
 import datetime
+import json
+import mmap
 import os
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+_SUFFIXES = (".rs", ".png")
+# Bounded so concurrent reads stay well below the open file limit.
+_MAX_WORKERS = 64
+_BUFFER_SIZE = 65536
+_REMOVE_LOG = "Remove last line with 999"
+_CACHE_FILE = '.loopfile_cache.json'
+
+
+def _read_flag(file):
+    # True when zero.md holds '0', i.e. the next toggle writes '1'.
+    return file.read(1) == b'0'
+
+
+def _flag_value(flag):
+    return b'1' if flag else b'0'
 
 
 def modify():
-    file = open('zero.md', 'r')
-    flag = int(file.readline()) == 0
-    file.close()
-    file = open('zero.md', 'w+')
-    if flag:
-        file.write('1')
-    else:
-        file.write('0')
-        file.close()
+    with open('zero.md', 'r+b', buffering=_BUFFER_SIZE) as file:
+        flag = _read_flag(file)
+        file.seek(0)
+        file.write(_flag_value(flag))
+        file.truncate(1)
 
 
-def loopfile():
-    directory = os.getcwd()
-    for filename in os.listdir(directory):
-        if filename.endswith(".rs") or filename.endswith(".png"):
-            print(os.path.join(directory, filename))
-
-            with open(filename, "a+") as file_object:
-                # Move read cursor to the start of file.
-                file_object.seek(0)
-                # If file is not empty then append '\n'
-                data = file_object.read(100)
-
-                for last_line in file_object:
-                    pass
-                print(filename)
-                print(last_line)
-                file_object.close()
-                # If the file is updated in the last cycle
-                if last_line == " 01":
-                    remove_999(filename)
-                # else:
-                    # append_999(filename)
+def _last_line(entry):
+    # entry.stat() is one stat call cached on the entry; empty files are
+    # never opened.
+    size = entry.stat().st_size
+    if size == 0:
+        return ""
+    with open(entry.name, "rb") as file_object:
+        # Only the tail of the file is needed to find its last line.
+        file_object.seek(max(0, size - 256))
+        tail = file_object.read()
+    return tail.rsplit(b"\n", 1)[-1].decode(errors="replace")
 
+
+def _load_cache():
+    try:
+        with open(_CACHE_FILE, 'r') as fd:
+            cache = json.load(fd)
+    except (OSError, ValueError):
+        return {}
+    # A damaged cache only costs a re-read, never a failed run.
+    return cache if isinstance(cache, dict) else {}
+
+
+def _stamp(entry):
+    st = entry.stat()
+    return [st.st_mtime_ns, st.st_size]
+
+
+def loopfile():
+    with os.scandir('.') as it:
+        entries = [entry for entry in it
+                   if entry.name.endswith(_SUFFIXES) and entry.is_file()]
+
+    # Files unchanged since the last run keep their cached last line.
+    cache = _load_cache()
+    index = {}
+    stale = []
+    for entry in entries:
+        stamp = _stamp(entry)
+        cached = cache.get(entry.name)
+        if isinstance(cached, list) and len(cached) == 3 and cached[:2] == stamp:
+            index[entry.name] = cached
         else:
-            continue
+            index[entry.name] = stamp
+            stale.append(entry)
+
+    with ThreadPoolExecutor(max_workers=_MAX_WORKERS) as executor:
+        # First pass only reads, so the rewrites below are done in one batch.
+        for entry, last_line in zip(stale, executor.map(_last_line, stale)):
+            index[entry.name].append(last_line)
+
+        logs = []
+        pending = []
+        for entry in entries:
+            filename = entry.name
+            last_line = index[filename][2]
+            logs.append("%s\n%s\n" % (filename, last_line))
+            # If the file is updated in the last cycle
+            if last_line == " 01":
+                logs.append(_REMOVE_LOG + "\n")
+                pending.append(filename)
+        # One write for the whole listing; stdout may be line buffered.
+        sys.stdout.write("".join(logs))
+
+        # Workers only truncate, all output stays on this thread.
+        list(executor.map(_remove_last_line, pending))
+    for filename in pending:
+        del index[filename]
+
+    with open(_CACHE_FILE, 'w') as fd:
+        json.dump(index, fd)
 
 
 def remove_999(filename):
-    print("Remove last line with 999")
-    fd = open(filename, "r")
-    d = fd.read()
-    fd.close()
-    m = d.split("\n")
-    s = "\n".join(m[:-1])
-    fd = open(filename, "w+")
-    for i in range(len(s)):
-        fd.write(s[i])
-    fd.close()
+    print(_REMOVE_LOG)
+    _remove_last_line(filename)
 
 
-def append_999(filename):
-    print("Append last line with 999")
-    with open(filename, "a+") as fil:
-        fil.seek(0)
-        data = fil.read(100)
-        if len(data) > 0:
-            fil.write("\n//999")
-    fil.close()
+def _remove_last_line(filename):
+    with open(filename, "r+b", buffering=_BUFFER_SIZE) as fd:
+        # Drop the last line in place instead of rewriting the whole file.
+        cut = 0
+        if os.fstat(fd.fileno()).st_size > 0:
+            with mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                cut = max(mm.rfind(b"\n"), 0)
+                # Also drop the \r of a final CRLF. Unlike the old text-mode
+                # rewrite, earlier CRLF line endings are kept as they are.
+                if mm[cut - 1:cut] == b"\r":
+                    cut -= 1
+        fd.truncate(cut)
 
 
-def commit():
-    os.system('git commit -a -m "merge and update" > /dev/null 2>&1')
+def append_999(filename):
+    print("Append last line with 999")
+    if os.stat(filename).st_size > 0:
+        with open(filename, "ab", buffering=_BUFFER_SIZE) as fil:
+            fil.write(b"\n//999")
 
 
-def set_sys_time(year, month, day):
-    os.system('date -s %04d%02d%02d' % (year, month, day))
+def commit(date=None):
+    env = None
+    if date is not None:
+        env = dict(os.environ, GIT_AUTHOR_DATE=date, GIT_COMMITTER_DATE=date)
+    subprocess.run(['git', 'commit', '-a', '-m', 'merge and update'],
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env)
 
 
 def trick_commit(year, month, day):
-    set_sys_time(year, month, day)
+    # git takes the date from the environment, no need to move the clock.
     modify()
-    commit()
+    commit('%04d-%02d-%02d 12:00:00 +0000' % (year, month, day))
 
 
-def daily_commit(start_date, end_date):
-    for i in range((end_date - start_date).days + 1):
+def _commit_time(cur_date):
+    return calendar.timegm(cur_date.timetuple()) + 12 * 3600
+
+
+def _insert_blob(pygit2, repo, tree, parts, blob_id):
+    # Rebuild each tree on the way down to the blob, the rest is reused.
+    builder = repo.TreeBuilder(tree) if tree is not None else repo.TreeBuilder()
+    name = parts[0]
+    if len(parts) == 1:
+        builder.insert(name, blob_id, pygit2.GIT_FILEMODE_BLOB)
+    else:
+        subtree = tree[name] if tree is not None and name in tree else None
+        subtree_id = _insert_blob(pygit2, repo, subtree, parts[1:], blob_id)
+        builder.insert(name, subtree_id, pygit2.GIT_FILEMODE_TREE)
+    return builder.write()
+
+
+def _daily_commit_pygit2(pygit2, start_date, days, flag):
+    repo = pygit2.Repository('.')
+    ref = repo.head.name
+    parent = repo.head.target
+    author = repo.default_signature
+    # Tree and index paths are relative to the workdir, not the current directory.
+    path = os.path.relpath(os.path.abspath('zero.md'), repo.workdir).replace(os.sep, '/')
+
+    # zero.md only ever holds '0' or '1', so two trees cover every day.
+    trees = {}
+    for value in (b'0', b'1'):
+        trees[value] = _insert_blob(pygit2, repo, repo[parent].tree, path.split('/'),
+                                    repo.create_blob(value))
+
+    for i in range(days):
+        cur_date = start_date + datetime.timedelta(days=i)
+        sig = pygit2.Signature(author.name, author.email, _commit_time(cur_date), 0)
+        parent = repo.create_commit(None, sig, sig, 'merge and update\n',
+                                    trees[_flag_value(flag)], [parent])
+        flag = not flag
+    repo.references[ref].set_target(parent, message='daily_commit')
+
+    # Only the ref moved, bring zero.md and its index entry in line with it.
+    with open('zero.md', 'wb') as file:
+        file.write(_flag_value(not flag))
+    repo.index.add(path)
+    repo.index.write()
+
+
+def _daily_commit_fast_import(start_date, days, flag):
+    ref = subprocess.check_output(['git', 'symbolic-ref', 'HEAD']).decode().strip()
+    ident = subprocess.check_output(['git', 'var', 'GIT_COMMITTER_IDENT']).decode()
+    committer = ident[:ident.rindex('>') + 1]
+    # fast-import paths are relative to the top level, the rest of this
+    # function works on the zero.md in the current directory.
+    path = subprocess.check_output(['git', 'rev-parse', '--show-prefix']).decode().strip()
+    path += 'zero.md'
+
+    # Every day goes through one fast-import stream; the date is part of
+    # the committer line, so the system clock is left alone.
+    importer = subprocess.Popen(['git', 'fast-import', '--quiet', '--date-format=raw'],
+                                stdin=subprocess.PIPE)
+    message = 'merge and update\n'
+    for i in range(days):
         cur_date = start_date + datetime.timedelta(days=i)
-        trick_commit(cur_date.year, cur_date.month, cur_date.day)
+        record = 'commit %s\ncommitter %s %d +0000\ndata %d\n%s' % (
+            ref, committer, _commit_time(cur_date), len(message), message)
+        if i == 0:
+            record += 'from %s^0\n' % ref
+        record += 'M 100644 inline %s\ndata 1\n' % path
+        importer.stdin.write(record.encode() + _flag_value(flag) + b'\n')
+        flag = not flag
+    importer.stdin.close()
+    if importer.wait() != 0:
+        raise subprocess.CalledProcessError(importer.returncode, importer.args)
+
+    # Only the ref moved, bring zero.md and its index entry in line with it.
+    with open('zero.md', 'wb') as file:
+        file.write(_flag_value(not flag))
+    subprocess.check_call(['git', 'reset', '-q', '--', 'zero.md'])
+
+
+def daily_commit(start_date, end_date):
+    days = (end_date - start_date).days + 1
+    if days <= 0:
+        return
+    with open('zero.md', 'rb') as file:
+        flag = _read_flag(file)
+
+    # Build the commits in-process when libgit2 is available. pygit2 is
+    # imported here so loopfile() runs don't pay for it.
+    try:
+        import pygit2
+    except ImportError:
+        _daily_commit_fast_import(start_date, days, flag)
+    else:
+        _daily_commit_pygit2(pygit2, start_date, days, flag)
 
 
 if __name__ == '__main__':
@@ -1,59 +1,94 @@
+import mmap
 import os
+import subprocess
+import sys
 import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+_SUFFIXES = (".rs", ".png")
+# Bounded so concurrent reads stay well below the open file limit.
+_MAX_WORKERS = 64
+_BUFFER_SIZE = 65536
+_REMOVE_LOG = "Remove last line with 999"
+_APPEND_LOG = "Append last line with 999"
+
+
+def _last_line(entry):
+    # entry.stat() is one stat call cached on the entry; empty files are
+    # never opened.
+    size = entry.stat().st_size
+    if size == 0:
+        return ""
+    with open(entry.name, "rb") as file_object:
+        # Only the tail of the file is needed to find its last line.
+        file_object.seek(max(0, size - 256))
+        tail = file_object.read()
+    return tail.rsplit(b"\n", 1)[-1].decode(errors="replace")
 
 
 def loopfile():
-    directory = os.getcwd()
-    for filename in os.listdir(directory):
-        if filename.endswith(".rs") or filename.endswith(".png"):
-            print(os.path.join(directory, filename))
-
-            with open(filename, "a+") as file_object:
-                # Move read cursor to the start of file.
-                file_object.seek(0)
-                # If file is not empty then append '\n'
-                data = file_object.read(100)
-
-                for last_line in file_object:
-                    pass
-                print(filename)
-                print(last_line)
-                file_object.close()
-                # If the file is updated in the last cycle
-                if last_line == "#999":
-                    remove_999(filename)
-                else:
-                    append_999(filename)
-
-        else:
-            continue
+    with os.scandir('.') as it:
+        entries = [entry for entry in it
+                   if entry.name.endswith(_SUFFIXES) and entry.is_file()]
+
+    with ThreadPoolExecutor(max_workers=_MAX_WORKERS) as executor:
+        # First pass only reads, so the rewrites below are done in one batch.
+        last_lines = executor.map(_last_line, entries)
+
+        logs = []
+        removes = []
+        appends = []
+        for entry, last_line in zip(entries, last_lines):
+            filename = entry.name
+            logs.append("%s\n%s\n" % (filename, last_line))
+            # If the file is updated in the last cycle
+            if last_line == "#999":
+                logs.append(_REMOVE_LOG + "\n")
+                removes.append(filename)
+            else:
+                logs.append(_APPEND_LOG + "\n")
+                appends.append(filename)
+        # One write for the whole listing; stdout may be line buffered.
+        sys.stdout.write("".join(logs))
+
+        # Workers only rewrite, all output stays on this thread.
+        list(executor.map(_remove_last_line, removes))
+        list(executor.map(_append_last_line, appends))
 
 
 def remove_999(filename):
-    print("Remove last line with 999")
-    fd = open(filename, "r")
-    d = fd.read()
-    fd.close()
-    m = d.split("\n")
-    s = "\n".join(m[:-1])
-    fd = open(filename, "w+")
-    for i in range(len(s)):
-        fd.write(s[i])
-    fd.close()
+    print(_REMOVE_LOG)
+    _remove_last_line(filename)
+
+
+def _remove_last_line(filename):
+    with open(filename, "r+b", buffering=_BUFFER_SIZE) as fd:
+        # Drop the last line in place instead of rewriting the whole file.
+        cut = 0
+        if os.fstat(fd.fileno()).st_size > 0:
+            with mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                cut = max(mm.rfind(b"\n"), 0)
+                # Also drop the \r of a final CRLF. Unlike the old text-mode
+                # rewrite, earlier CRLF line endings are kept as they are.
+                if mm[cut - 1:cut] == b"\r":
+                    cut -= 1
+        fd.truncate(cut)
 
 
 def append_999(filename):
-    print("Append last line with 999")
-    with open(filename, "a+") as fil:
-        fil.seek(0)
-        data = fil.read(100)
-        if len(data) > 0:
-            fil.write("\n//999")
-    fil.close()
+    print(_APPEND_LOG)
+    _append_last_line(filename)
+
+
+def _append_last_line(filename):
+    if os.stat(filename).st_size > 0:
+        with open(filename, "ab", buffering=_BUFFER_SIZE) as fil:
+            fil.write(b"\n//999")
 
 
 def commit():
-    os.system('git commit -a -m "merge and update" > /dev/null 2>&1')
+    subprocess.run(['git', 'commit', '-a', '-m', 'merge and update'],
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
 
 
 def set_sys_time(year, month, day):